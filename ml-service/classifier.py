@@ -1,5 +1,5 @@
-"""TransactionClassifier
------------------------
+"""TransactionClassifier / FastClassifier
+----------------------------------------
 TF-IDF vectorisation + Logistic Regression pipeline that maps transaction
 description text to a spending category slug.
 
@@ -7,172 +7,892 @@ Design decisions
 ----------------
 * char_wb n-grams (2–4) handle abbreviations, typos, and partial merchant
   names common in mobile-money / POS descriptions.
-* Logistic Regression (multinomial, lbfgs) gives calibrated probability
-  estimates used directly as confidence scores and trains in < 1 second
-  on our seed dataset.
+* Text is lowercased and accent-stripped once by _preprocess (with a
+  plain-ASCII fast path); the vectorizer itself is configured not to repeat
+  either step.
+* n-grams are hashed into a fixed 2**18-wide space (HashingVectorizer +
+  TfidfTransformer) instead of being looked up in a learned vocabulary, so
+  tokenisation never touches a Python dict and training skips the
+  vocabulary build.
+* Logistic Regression (multinomial, SAGA) gives calibrated probability
+  estimates used directly as confidence scores. SAGA's per-sample updates
+  only touch the non-zero columns of the sparse TF-IDF rows, so it trains
+  in < 1 second on our seed dataset even with 2**18 hashed features;
+  tol=1e-3 stops it once the loss plateaus. Retrains warm-start SAGA from
+  the live model's coefficients whenever the label set is unchanged.
+* The TF-IDF matrix is float32 end to end (hashing, idf weighting, SAGA's
+  sparse dot products), halving memory traffic during fit.
 * class_weight="balanced" handles the natural imbalance across categories.
-* The fitted pipeline is persisted with joblib so the service restarts
-  without retraining every time.
+* The fitted pipeline is persisted with joblib (lz4-compressed — the hashed
+  coefficient and IDF arrays are mostly zeros/constants) so the service
+  restarts without retraining every time.
+* Serving bypasses scikit-learn entirely. FastClassifier holds only the
+  arrays inference needs (transposed float32 coefficients, intercepts, IDF
+  vector, class names); n-grams are hashed by a Numba kernel
+  (ngram_hash.py) that reproduces the training HashingVectorizer, and only
+  the touched coefficient rows are multiplied. scikit-learn is used for
+  training only.
+* Those arrays are also written as raw .npy sidecars next to the joblib
+  file (<model_path>.arrays/) and memory-mapped read-only at startup, so a
+  restart never unpickles scikit-learn objects, and uvicorn workers share
+  one copy of the coefficients through the OS page cache instead of each
+  holding its own. This needs the sidecars on a local filesystem; network
+  mounts may not share cached pages between processes.
+  A manifest written last commits each set of sidecars and records a
+  content digest of the joblib file it was lifted from; sidecars that do
+  not match the joblib on disk are ignored and rebuilt from it. Being
+  content-based, the match survives copies (cp -a, backups, image layers).
+* Descriptions carrying an unambiguous merchant or keyword ("NETFLIX",
+  "HOUSE RENT - JAN", "... FUEL") are routed by a precompiled regex
+  alternation (_FAST_RULES) without invoking the model at all — unless a
+  user correction for that description contradicts the rule, in which case
+  the model (which trained on the correction) answers instead.
+* Merchant strings repeat heavily, so single predictions are memoised in an
+  LRU cache keyed on the preprocessed text. Each bound model gets a fresh
+  cache, swapped in together with it.
+* Retraining builds the new model off to the side and swaps it in with a
+  single attribute assignment, so predictions keep being served from the
+  old model meanwhile; a lock serialises concurrent retrains.
 * A JSONL feedback file accumulates user corrections; /retrain merges them
-  into the base dataset and refits.
+  into the base dataset and refits. add_feedback only queues the serialised
+  line in memory; a daemon thread appends queued lines with one write() and
+  one fsync() per batch. Parsed corrections are kept in memory
+  together with the byte offset reached, so each retrain only parses lines
+  appended since the previous one.
 """
 from __future__ import annotations
 
-import json
+import atexit
+import hashlib
 import logging
 import os
-from typing import Optional
+import pickle
+import re
+import threading
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Callable, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
 
 import joblib
-from sklearn.feature_extraction.text import TfidfVectorizer
+import numpy as np
+import orjson
+from scipy.sparse import csr_matrix
+from scipy.special import softmax
+from sklearn.feature_extraction.text import (
+    HashingVectorizer,
+    TfidfTransformer,
+    strip_accents_unicode,
+)
 from sklearn.linear_model import LogisticRegression
 from sklearn.pipeline import Pipeline
 
-from training_data import TRAINING_SAMPLES
+from ngram_hash import char_wb_counts
+from training_data import TRAINING_LABELS, TRAINING_TEXTS
 
 log = logging.getLogger("ml-service.classifier")
 
 FEEDBACK_PATH = os.getenv("FEEDBACK_PATH", "feedback.jsonl")
+NGRAM_RANGE = (2, 4)
+N_FEATURES = 2 ** 18
+DEFAULT_TOP_K = 3
+SCORE_DECIMALS = 4
+# _verify_fast_path probes every VERIFY_STRIDE-th seed sample
+VERIFY_STRIDE = 5
+VERIFY_ATOL = 1e-5
+# Refits seeded from the live model's coefficients start near the optimum
+WARM_START_MAX_ITER = 50
+PREDICT_CACHE_SIZE = int(os.getenv("PREDICT_CACHE_SIZE", "8192"))
+FEEDBACK_FLUSH_INTERVAL = float(os.getenv("FEEDBACK_FLUSH_INTERVAL", "0.5"))
+FEEDBACK_BATCH_SIZE = int(os.getenv("FEEDBACK_BATCH_SIZE", "256"))
+FEEDBACK_MAX_PENDING = int(os.getenv("FEEDBACK_MAX_PENDING", "10000"))
+# (slug, confidence, ((slug, probability), ...)) — hashable, so it can be cached.
+# The inner pairs hold the top-k classes, most likely first.
+ScoredText = tuple[str, float, tuple[tuple[str, float], ...]]
+
 VALID_SLUGS = {
     "food-dining", "transport", "social", "entertainment",
     "utilities", "health", "education", "clothing",
     "rent-housing", "savings", "income", "other",
 }
 
+# Merchants and keywords that identify a category on their own. A match skips
+# the model entirely and is reported with FAST_RULE_CONFIDENCE. Keep this to
+# unambiguous signals — anything context-dependent belongs to the model.
+# Rules are tried in order, so a more specific pattern must precede any
+# broader one it overlaps ("bolt food" before "bolt"). Descriptions whose
+# user feedback disagrees with their rule bypass it (see _rule_overrides).
+FAST_RULE_CONFIDENCE = 0.99
+_FAST_RULES: list[tuple[str, str]] = [
+    (r"\b(?:netflix|showmax|spotify|dstv|azam tv|youtube premium|playstation|xbox)\b", "entertainment"),
+    (r"\b(?:century cinemax|imax)\b", "entertainment"),
+    (r"\b(?:kplc|kenya power|nairobi water|zuku|faiba)\b", "utilities"),
+    (r"\b(?:airtime|data bundles?)\b", "utilities"),
+    (r"\b(?:uber eats|bolt food)\b", "food-dining"),
+    (r"\b(?:java house|kfc|chicken inn|pizza inn|artcaffe|glovo)\b", "food-dining"),
+    (r"\b(?:uber|bolt|indrive|little cab)\b", "transport"),
+    (r"\b(?:matatu|boda boda|tuk tuk|sgr|madaraka express|easy coach)\b", "transport"),
+    (r"\b(?:petrol|fuel)\b", "transport"),
+    # Bare "rent" also covers car/equipment hire, so require a housing cue.
+    (r"\b(?:landlord|(?:house|monthly|room|apartment|bedsitter|estate) rent)\b", "rent-housing"),
+    (r"\b(?:pharmacy|chemist|hospital|nhif)\b", "health"),
+    (r"\b(?:tuition|school fees|udemy|coursera|kasneb|knec)\b", "education"),
+    (r"\b(?:sacco|m-shwari|chama|nssf|m-akiba)\b", "savings"),
+    (r"\b(?:mitumba|zara|mr price)\b", "clothing"),
+]
+# One alternation with a named group per rule: a single regex scan finds the
+# first matching rule, and m.lastgroup says which one it was.
+_FAST_RULES_RE = re.compile(
+    "|".join(f"(?P<r{i}>{pattern})" for i, (pattern, _) in enumerate(_FAST_RULES)),
+    re.IGNORECASE,
+)
+_FAST_RULE_SLUGS = {f"r{i}": slug for i, (_, slug) in enumerate(_FAST_RULES)}
+
+
+def _match_fast_rule(text: str) -> Optional[str]:
+    """Category slug of the first fast rule matching *text*, if any."""
+    m = _FAST_RULES_RE.search(text)
+    return _FAST_RULE_SLUGS[m.lastgroup] if m else None
+
+
+def _verify_fast_path(pipeline: Pipeline, fast: FastClassifier) -> None:
+    """
+    Check that *fast* reproduces pipeline.predict_proba on a slice of the
+    seed data, through both the single-text and the batch path. Run when a
+    pickled pipeline is loaded, so an artifact produced by a scikit-learn
+    version that hashes or weights differently is rejected rather than
+    served. Full parity coverage lives in tests/test_classifier.py.
+    """
+    probe = [_preprocess(t) for t in TRAINING_TEXTS[::VERIFY_STRIDE]]
+    expected = pipeline.predict_proba(probe)
+    batch = fast.predict_proba(probe)
+    single = np.vstack([fast.predict_proba_one(t) for t in probe])
+    for name, actual in (("batch", batch), ("single", single)):
+        err = float(np.abs(actual - expected).max())
+        if err > VERIFY_ATOL:
+            raise RuntimeError(
+                f"Fast {name} inference disagrees with the fitted pipeline "
+                f"(max |Δp| = {err:.2e} > {VERIFY_ATOL:.0e})."
+            )
+
+
+@contextmanager
+def _exclusive_lock(path: str) -> Iterator[None]:
+    """
+    Inter-process lock held via flock() on *path*. Platforms without fcntl
+    (Windows) run single-worker in practice, so the lock is skipped there.
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(path, "a") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def _file_digest(path: str) -> str:
+    """
+    Content digest of *path*. The joblib artifact is a few hundred KB, so
+    this costs about a millisecond at startup.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _round_scores(proba: np.ndarray) -> np.ndarray:
+    """
+    Round probabilities to SCORE_DECIMALS in one vectorised pass. Widened to
+    float64 first so tolist() yields e.g. 0.5229 rather than the nearest
+    float32 (0.5228999853...).
+    """
+    return np.round(proba.astype(np.float64), SCORE_DECIMALS)
+
+
+def _preprocess(text: str) -> str:
+    """
+    Lowercase and strip accents — the normalisation applied to training and
+    prediction text alike. Most descriptions are plain ASCII, where
+    lowercasing is all that is needed and no Unicode decomposition is done.
+    """
+    if text.isascii():
+        return text.lower()
+    return strip_accents_unicode(text.lower())
+
+
+class FastClassifier:
+    """
+    Serving-only view of a trained model: plain NumPy arrays, no scikit-learn
+    objects. Scores already-preprocessed text (see _preprocess).
+    """
+
+    ARRAY_NAMES = ("coef_T", "intercept", "idf", "classes")
+    MANIFEST_NAME = "manifest.json"
+
+    def __init__(
+        self,
+        coef_T: np.ndarray,
+        intercept: np.ndarray,
+        idf: np.ndarray,
+        classes: np.ndarray,
+    ) -> None:
+        self.coef_T = coef_T          # (N_FEATURES, n_classes) float32
+        self.intercept = intercept    # (n_classes,) float32
+        self.idf = idf                # (N_FEATURES,) float32
+        self.classes = classes        # (n_classes,) unicode
+        # Plain-str copy built once; every prediction indexes/zips this list.
+        self.classes_: list[str] = classes.tolist()
+
+    @classmethod
+    def from_pipeline(cls, pipeline: Pipeline) -> "FastClassifier":
+        clf: LogisticRegression = pipeline.named_steps["clf"]
+        transformer: TfidfTransformer = pipeline.named_steps["tfidf"].named_steps["tfidf"]
+        return cls(
+            coef_T=np.ascontiguousarray(clf.coef_.T, dtype=np.float32),
+            intercept=np.asarray(clf.intercept_, dtype=np.float32),
+            idf=np.asarray(transformer.idf_, dtype=np.float32),
+            classes=np.asarray(clf.classes_, dtype=str),
+        )
+
+    @classmethod
+    def load(cls, path: str, source: Optional[str] = None) -> "FastClassifier":
+        """
+        Memory-map the .npy sidecars committed in directory *path*; nothing
+        is copied. With *source*, refuse sidecars whose manifest records a
+        different model file digest.
+        """
+        with open(os.path.join(path, cls.MANIFEST_NAME), "rb") as fh:
+            manifest = orjson.loads(fh.read())
+        if source is not None and manifest["source"] != source:
+            raise ValueError(f"Sidecar arrays in {path} were not saved from the current model file")
+        generation = manifest["generation"]
+        arrays = {
+            name: np.asarray(
+                np.load(os.path.join(path, f"{name}.{generation}.npy"), mmap_mode="r")
+            )
+            for name in cls.ARRAY_NAMES
+        }
+        if arrays["coef_T"].shape != (N_FEATURES, arrays["classes"].shape[0]):
+            raise ValueError(f"Sidecar arrays in {path} do not match N_FEATURES={N_FEATURES}")
+        return cls(**arrays)
+
+    def save(self, path: str, source: Optional[str] = None) -> None:
+        """
+        Write the arrays to directory *path* as a new generation,
+        <name>.<generation>.npy, then commit it by renaming a manifest naming
+        that generation (and the *source* model file digest) into place.
+        Readers therefore see the previous complete set or the new one, never
+        a mix. The generation the manifest replaced is removed afterwards;
+        processes that still map its files keep a valid view.
+        """
+        os.makedirs(path, exist_ok=True)
+        generation = uuid.uuid4().hex
+        for name in self.ARRAY_NAMES:
+            with open(os.path.join(path, f"{name}.{generation}.npy"), "wb") as fh:
+                np.save(fh, getattr(self, name), allow_pickle=False)
+                fh.flush()
+                os.fsync(fh.fileno())
+
+        manifest = os.path.join(path, self.MANIFEST_NAME)
+        try:
+            with open(manifest, "rb") as fh:
+                replaced = orjson.loads(fh.read())["generation"]
+        except (OSError, ValueError, KeyError):
+            replaced = None
+        tmp = f"{manifest}.{generation}.tmp"
+        with open(tmp, "wb") as fh:
+            fh.write(orjson.dumps({"generation": generation, "source": source}))
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, manifest)
+
+        # Drop the replaced generation, and pre-manifest <name>.npy files.
+        for name in self.ARRAY_NAMES:
+            stale = [f"{name}.npy"] + ([f"{name}.{replaced}.npy"] if replaced else [])
+            for filename in stale:
+                try:
+                    os.remove(os.path.join(path, filename))
+                except OSError:  # already gone, or still mapped (Windows)
+                    pass
+
+    def score(self, text: str, top_k: Optional[int] = DEFAULT_TOP_K) -> ScoredText:
+        """
+        Return (slug, confidence, ((slug, probability), ...)) for one text,
+        listing the *top_k* most likely classes (every class if None).
+        """
+        proba = self.predict_proba_one(text)
+        top = self._top_k(proba[None, :], top_k)[0]
+        slugs = self.classes[top].tolist()
+        top_proba = _round_scores(proba[top]).tolist()
+        return slugs[0], top_proba[0], tuple(zip(slugs, top_proba))
+
+    def score_many(
+        self, texts: list[str], top_k: Optional[int] = DEFAULT_TOP_K
+    ) -> list[ScoredText]:
+        """Batch variant of score(), built on predict_proba()."""
+        proba = self.predict_proba(texts)
+        top = self._top_k(proba, top_k)
+        # Slugs and probabilities for the whole batch in two array ops.
+        slugs = self.classes[top].tolist()
+        top_proba = _round_scores(np.take_along_axis(proba, top, axis=1)).tolist()
+        return [
+            (row_slugs[0], row_proba[0], tuple(zip(row_slugs, row_proba)))
+            for row_slugs, row_proba in zip(slugs, top_proba)
+        ]
+
+    def predict_proba_one(self, text: str) -> np.ndarray:
+        """
+        Class probabilities for one text. The hashed row is scored by
+        gathering only the coefficient rows it touches — no sparse matrix,
+        no scikit-learn input validation or dispatch.
+        """
+        idx, weights = self._tfidf_row(text)
+        return softmax(weights @ self.coef_T[idx] + self.intercept)
+
+    def predict_proba(self, texts: list[str]) -> np.ndarray:
+        """
+        Class probabilities for many texts: the hashed rows are stacked into
+        one CSR matrix and scored with a single CSR × dense matmul against
+        the contiguous transposed coefficients.
+        """
+        rows = [self._tfidf_row(t) for t in texts]
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum([len(idx) for idx, _ in rows], out=indptr[1:])
+        X = csr_matrix(
+            (
+                np.concatenate([w for _, w in rows]),
+                np.concatenate([idx for idx, _ in rows]),
+                indptr,
+            ),
+            shape=(len(rows), N_FEATURES),
+        )
+        return softmax(X @ self.coef_T + self.intercept, axis=1)
+
+    @staticmethod
+    def _top_k(proba: np.ndarray, k: Optional[int]) -> np.ndarray:
+        """Column indices of the k largest entries of each row, largest first."""
+        n_classes = proba.shape[1]
+        if k is None or k >= n_classes:
+            top = np.broadcast_to(np.arange(n_classes), proba.shape)
+        else:
+            # O(C) partial selection, then sort only the k survivors.
+            top = np.argpartition(proba, -k, axis=1)[:, -k:]
+        order = np.argsort(-np.take_along_axis(proba, top, axis=1), axis=1, kind="stable")
+        return np.take_along_axis(top, order, axis=1)
+
+    def _tfidf_row(self, text: str) -> tuple[np.ndarray, np.ndarray]:
+        """Non-zero (indices, weights) of the TF-IDF row for *text*."""
+        idx, counts = char_wb_counts(text, NGRAM_RANGE, N_FEATURES)
+        # Same weighting as TfidfTransformer(sublinear_tf=True, norm="l2")
+        weights = (1.0 + np.log(counts)) * self.idf[idx]
+        norm = np.sqrt(weights @ weights)
+        if norm > 0:
+            weights /= norm
+        return idx, weights
+
 
 class TransactionClassifier:
     """Thin wrapper around a scikit-learn Pipeline with persistence and feedback."""
 
     def __init__(self, model_path: str = "model.joblib") -> None:
         self.model_path = model_path
+        self.arrays_path = f"{model_path}.arrays"
+        # Only set after training in this process; serving uses self._fast.
         self.pipeline: Optional[Pipeline] = None
         self.classes_: list[str] = []
         self.is_trained: bool = False
+        self._fast: Optional[FastClassifier] = None
+        self._predict_cached: Optional[Callable[[str, Optional[int]], ScoredText]] = None
+        # Feedback parsed so far, and the byte offset in FEEDBACK_PATH it
+        # covers; the offset is only valid for the file (st_dev, st_ino) it
+        # was read from.
+        self._feedback_texts: list[str] = []
+        self._feedback_labels: list[str] = []
+        self._feedback_offset: int = 0
+        self._feedback_file: Optional[tuple[int, int]] = None
+        # Write-behind buffer for add_feedback (see _flush_loop)
+        self._fb_queue: deque[bytes] = deque()
+        self._fb_lock = threading.Lock()
+        self._fb_wakeup = threading.Event()
+        self._fb_closed = False
+        self._fb_fd: Optional[int] = None
+        # Set by a failed flush, cleared by the next successful one
+        self._fb_error: Optional[OSError] = None
+        self._fb_flusher: Optional[threading.Thread] = None
+        self._retrain_lock = threading.Lock()
+        # Preprocessed descriptions whose latest correction contradicts the
+        # fast rule they match; predict() sends these to the model.
+        self._rule_overrides: frozenset[str] = frozenset()
 
     # ── Public API ─────────────────────────────────────────────────────────
 
     def load_or_train(self) -> None:
-        """Load the persisted model from disk; train a fresh one if absent."""
-        if os.path.exists(self.model_path):
-            try:
-                self.pipeline = joblib.load(self.model_path)
-                self.classes_ = list(self.pipeline.classes_)
-                self.is_trained = True
-                log.info(
-                    "Model loaded from %s (%d classes, %d features)",
-                    self.model_path,
-                    len(self.classes_),
-                    self.pipeline.named_steps["tfidf"].get_feature_names_out().shape[0],
-                )
-                return
-            except Exception as exc:
-                log.warning("Could not load saved model (%s) — retraining.", exc)
+        """
+        Load the persisted model from disk; train a fresh one if absent.
+
+        The memory-mapped .npy sidecars are preferred when their manifest
+        matches the joblib file on disk. Otherwise (no sidecars, an older
+        layout, or sidecars left behind by an interrupted save) the joblib
+        file is loaded and the sidecars are rewritten from it; failing to
+        write them only costs the next start the same joblib load.
+
+        Under ``uvicorn --workers N`` every worker calls this at startup. The
+        first one to find nothing usable on disk builds the artifact while
+        holding an exclusive lock on <model_path>.lock; the others wait, then
+        map the sidecars it wrote instead of training again. A copied
+        artifact (e.g. baked into an image layer) is mapped as-is: nothing is
+        unpickled or rewritten, so every worker shares the same pages.
 
-        self._train(TRAINING_SAMPLES)
+        Stored feedback is read afterwards, so corrections that contradict a
+        fast rule keep taking precedence over it after a restart.
+        """
+        self._load_model()
+        self._read_new_feedback()
+        self._refresh_rule_overrides()
 
-    def predict(self, description: str) -> tuple[str, float, dict[str, float]]:
+    def predict(
+        self, description: str, top_k: Optional[int] = DEFAULT_TOP_K
+    ) -> tuple[str, float, dict[str, float]]:
         """
         Classify *description* and return (category_slug, confidence, all_scores).
 
         confidence is the probability for the top class (0–1).
-        all_scores is a mapping of every slug to its probability.
+        all_scores maps the *top_k* most likely slugs (every slug if None) to
+        their probabilities, most likely first. Probabilities are rounded to
+        SCORE_DECIMALS places.
+        """
+        if not self.is_trained or self._fast is None:
+            raise RuntimeError("Classifier is not trained yet.")
+
+        text = _preprocess(description.strip())
+        rule_slug = self._fast_rule(text)
+        if rule_slug is not None:
+            return rule_slug, FAST_RULE_CONFIDENCE, {rule_slug: FAST_RULE_CONFIDENCE}
+
+        slug, confidence, scores = self._predict_cached(text, top_k)
+        return slug, confidence, dict(scores)
+
+    def predict_many(
+        self, descriptions: list[str], top_k: Optional[int] = DEFAULT_TOP_K
+    ) -> list[tuple[str, float, dict[str, float]]]:
+        """
+        Classify every entry of *descriptions* with a single matmul.
+
+        Returns one (category_slug, confidence, all_scores) tuple per input,
+        in input order — the same shape as predict().
         """
-        if not self.is_trained or self.pipeline is None:
+        if not self.is_trained or self._fast is None:
             raise RuntimeError("Classifier is not trained yet.")
+        if not descriptions:
+            return []
 
-        text = description.strip().lower()
-        proba = self.pipeline.predict_proba([text])[0]
-        classes = list(self.pipeline.classes_)
-        best_idx = int(proba.argmax())
-        all_scores: dict[str, float] = dict(zip(classes, proba.tolist()))
-        return classes[best_idx], float(proba[best_idx]), all_scores
+        texts = [_preprocess(d.strip()) for d in descriptions]
+        results: list[Optional[tuple[str, float, dict[str, float]]]] = []
+        model_idx: list[int] = []
+        for i, text in enumerate(texts):
+            rule_slug = self._fast_rule(text)
+            if rule_slug is None:
+                model_idx.append(i)
+                results.append(None)
+            else:
+                results.append(
+                    (rule_slug, FAST_RULE_CONFIDENCE, {rule_slug: FAST_RULE_CONFIDENCE})
+                )
+
+        if model_idx:
+            scored = self._fast.score_many([texts[i] for i in model_idx], top_k)
+            for i, (slug, confidence, scores) in zip(model_idx, scored):
+                results[i] = (slug, confidence, dict(scores))
+        return results
 
     def add_feedback(self, description: str, correct_slug: str) -> None:
-        """Append a user correction to the feedback file."""
-        try:
-            entry = json.dumps({"text": description, "label": correct_slug})
-            with open(FEEDBACK_PATH, "a", encoding="utf-8") as fh:
-                fh.write(entry + "\n")
-            log.info("Feedback recorded: '%s' → %s", description[:60], correct_slug)
-        except (OSError, IOError) as exc:
-            log.exception("Failed to write feedback file %s: %s", FEEDBACK_PATH, exc)
-            raise
+        """
+        Queue a user correction for the feedback file.
+
+        The line reaches disk within FEEDBACK_FLUSH_INTERVAL seconds, or
+        sooner once FEEDBACK_BATCH_SIZE entries are pending.
+
+        Raises OSError while the feedback file cannot be written (the
+        queued entries are kept and retried), and RuntimeError once
+        FEEDBACK_MAX_PENDING entries are waiting, so a failing disk surfaces
+        as an error instead of unbounded memory growth.
+        """
+        if self._fb_closed:
+            raise RuntimeError("Feedback writer is closed.")
+        error = self._fb_error
+        if error is not None:
+            raise OSError(
+                error.errno, f"Feedback file {FEEDBACK_PATH} is not writable: {error.strerror}"
+            ) from error
+        if len(self._fb_queue) >= FEEDBACK_MAX_PENDING:
+            self._fb_wakeup.set()
+            raise RuntimeError(f"{FEEDBACK_MAX_PENDING} feedback entries are already pending.")
+        self._fb_queue.append(orjson.dumps({"text": description, "label": correct_slug}))
+        if self._fb_flusher is None:
+            self._start_feedback_flusher()
+        if len(self._fb_queue) >= FEEDBACK_BATCH_SIZE:
+            self._fb_wakeup.set()
+        log.info("Feedback recorded: '%s' → %s", description[:60], correct_slug)
+
+    def flush_feedback(self) -> None:
+        """Append every queued correction to FEEDBACK_PATH with one write + fsync."""
+        with self._fb_lock:
+            items = []
+            while self._fb_queue:
+                items.append(self._fb_queue.popleft())
+            if not items:
+                return
+
+            data = b"\n".join(items) + b"\n"
+            try:
+                fd = self._feedback_fd()
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(fd, view):]
+                os.fsync(fd)
+            except OSError as exc:
+                # Keep the entries so the next flush retries them; new ones
+                # are refused by add_feedback until a flush succeeds.
+                self._fb_queue.extendleft(reversed(items))
+                if self._fb_error is None:
+                    log.exception("Failed to write feedback file %s: %s", FEEDBACK_PATH, exc)
+                self._fb_error = exc
+                return
+            if self._fb_error is not None:
+                log.info("Feedback file %s is writable again", FEEDBACK_PATH)
+                self._fb_error = None
+        log.debug("Flushed %d feedback entries to %s", len(items), FEEDBACK_PATH)
+
+    def close(self) -> None:
+        """Stop the feedback flusher, writing out anything still queued."""
+        self._fb_closed = True
+        self._fb_wakeup.set()
+        if self._fb_flusher is not None:
+            self._fb_flusher.join()
+        self.flush_feedback()
+        with self._fb_lock:
+            if self._fb_fd is not None:
+                os.close(self._fb_fd)
+                self._fb_fd = None
+
+    @property
+    def retrain_in_progress(self) -> bool:
+        return self._retrain_lock.locked()
 
     def retrain(self) -> int:
         """
         Merge accumulated feedback with the base training set and refit.
         Returns the total number of training samples used.
+
+        Safe to call from a background thread: concurrent calls are
+        serialised, and predictions use the previous model until the new one
+        is bound.
         """
+        with self._retrain_lock:
+            try:
+                self.flush_feedback()
+                self._read_new_feedback()
+                texts = TRAINING_TEXTS + self._feedback_texts
+                labels = TRAINING_LABELS + self._feedback_labels
+
+                self._train(texts, labels)
+                self._refresh_rule_overrides()
+                return len(texts)
+            except Exception as exc:
+                log.exception("Retrain failed: %s", exc)
+                raise
+
+    # ── Private helpers ────────────────────────────────────────────────────
+
+    def _map_arrays(self) -> bool:
+        """Serve from the memory-mapped sidecars if present; True on success."""
+        if not os.path.isdir(self.arrays_path):
+            return False
         try:
-            samples = list(TRAINING_SAMPLES)
+            self._bind(FastClassifier.load(self.arrays_path, self._model_stamp()))
+        except Exception as exc:
+            log.warning("Could not map saved model arrays (%s) — trying %s.", exc, self.model_path)
+            return False
+        log.info(
+            "Model arrays mapped from %s (%d classes, %d features)",
+            self.arrays_path,
+            len(self.classes_),
+            N_FEATURES,
+        )
+        return True
+
+    def _load_model(self) -> None:
+        """Bind the persisted model for load_or_train, training it if need be."""
+        if self._map_arrays():
+            return
+
+        with _exclusive_lock(f"{self.model_path}.lock"):
+            # Another worker may have produced the sidecars while we waited.
+            if self._map_arrays():
+                return
 
-            if os.path.exists(FEEDBACK_PATH):
+            if os.path.exists(self.model_path):
                 try:
-                    with open(FEEDBACK_PATH, encoding="utf-8") as fh:
-                        for raw_line in fh:
-                            line = raw_line.strip()
-                            if not line:
-                                continue
-                            try:
-                                entry = json.loads(line)
-                                if entry.get("text") and entry.get("label") in VALID_SLUGS:
-                                    samples.append((entry["text"], entry["label"]))
-                            except json.JSONDecodeError:
-                                log.warning("Skipping malformed feedback line: %s", raw_line[:80])
-                except (OSError, IOError) as exc:
-                    log.warning("Could not read feedback file %s: %s", FEEDBACK_PATH, exc)
-
-            self._train(samples)
-            return len(samples)
-        except Exception as exc:
-            log.exception("Retrain failed: %s", exc)
+                    self._bind_pipeline(joblib.load(self.model_path), verify=True)
+                except Exception as exc:
+                    log.warning("Could not load saved model (%s) — retraining.", exc)
+                else:
+                    log.info(
+                        "Model loaded from %s (%d classes, %d features)",
+                        self.model_path,
+                        len(self.classes_),
+                        N_FEATURES,
+                    )
+                    self._save_arrays(self._model_stamp())
+                    return
+
+            self._train(TRAINING_TEXTS, TRAINING_LABELS)
+
+    def _fast_rule(self, text: str) -> Optional[str]:
+        """_match_fast_rule, unless feedback has overruled it for *text*."""
+        slug = _match_fast_rule(text)
+        if slug is None or text in self._rule_overrides:
+            return None
+        return slug
+
+    def _refresh_rule_overrides(self) -> None:
+        """Rebuild _rule_overrides from the feedback parsed so far."""
+        latest: dict[str, str] = {}
+        for text, label in zip(self._feedback_texts, self._feedback_labels):
+            latest[_preprocess(text.strip())] = label
+        self._rule_overrides = frozenset(
+            text for text, label in latest.items()
+            if _match_fast_rule(text) not in (None, label)
+        )
+
+    def _model_stamp(self) -> Optional[str]:
+        """Digest of the joblib file on disk, or None if there is none."""
+        try:
+            return _file_digest(self.model_path)
+        except FileNotFoundError:
+            return None
+
+    def _dump_pipeline(self) -> str:
+        """
+        Persist self.pipeline to model_path atomically (dump aside, then
+        rename) and return the digest of the file written.
+        """
+        tmp = f"{self.model_path}.{os.getpid()}.tmp"
+        try:
+            joblib.dump(
+                self.pipeline,
+                tmp,
+                compress=("lz4", 3),
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+            # Digest our own file: another worker may rename its model in
+            # right after us, and its digest must not be recorded for our arrays.
+            digest = _file_digest(tmp)
+            os.replace(tmp, self.model_path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
             raise
+        return digest
 
-    # ── Private helpers ────────────────────────────────────────────────────
+    def _save_arrays(self, source: Optional[str]) -> None:
+        """
+        Write the served arrays as sidecars for *source*. Failure is logged,
+        not raised: the model keeps serving from memory and the next start
+        falls back to the joblib file.
+        """
+        try:
+            self._fast.save(self.arrays_path, source)
+        except OSError as exc:
+            log.warning("Could not write model arrays to %s: %s", self.arrays_path, exc)
+
+    def _start_feedback_flusher(self) -> None:
+        with self._fb_lock:
+            if self._fb_flusher is not None:
+                return
+            self._fb_flusher = threading.Thread(
+                target=self._flush_loop, name="feedback-flusher", daemon=True
+            )
+            self._fb_flusher.start()
+        atexit.register(self.close)
+
+    def _flush_loop(self) -> None:
+        while not self._fb_closed:
+            self._fb_wakeup.wait(FEEDBACK_FLUSH_INTERVAL)
+            self._fb_wakeup.clear()
+            self.flush_feedback()
+
+    def _feedback_fd(self) -> int:
+        """O_APPEND descriptor for FEEDBACK_PATH, reopened if the file was replaced."""
+        if self._fb_fd is not None:
+            try:
+                current = os.stat(FEEDBACK_PATH)
+                opened = os.fstat(self._fb_fd)
+                if (current.st_dev, current.st_ino) == (opened.st_dev, opened.st_ino):
+                    return self._fb_fd
+            except FileNotFoundError:
+                pass
+            os.close(self._fb_fd)
+            self._fb_fd = None
+        self._fb_fd = os.open(FEEDBACK_PATH, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        return self._fb_fd
+
+    def _read_new_feedback(self) -> None:
+        """Parse feedback lines appended since the last call into memory."""
+        if not os.path.exists(FEEDBACK_PATH):
+            self._reset_feedback(None)
+            return
 
-    def _train(self, samples: list[tuple[str, str]]) -> None:
         try:
-            texts, labels = zip(*samples)
+            with open(FEEDBACK_PATH, "rb") as fh:
+                st = os.fstat(fh.fileno())
+                file_id = (st.st_dev, st.st_ino)
+                if file_id != self._feedback_file or st.st_size < self._feedback_offset:
+                    # New file (rotated/replaced) or truncated — start over.
+                    if self._feedback_file is not None:
+                        log.info(
+                            "Feedback file %s was replaced or truncated; re-reading from the start",
+                            FEEDBACK_PATH,
+                        )
+                    self._reset_feedback(file_id)
+                fh.seek(self._feedback_offset)
+                data = fh.read()
+        except (OSError, IOError) as exc:
+            log.warning("Could not read feedback file %s: %s", FEEDBACK_PATH, exc)
+            return
+
+        # Only consume complete lines; a partially written tail is picked up
+        # on the next call.
+        end = data.rfind(b"\n") + 1
+        for raw_line in data[:end].splitlines():
+            line = raw_line.strip()
+            if not line:
+                continue
+            try:
+                entry = orjson.loads(line)
+                if entry.get("text") and entry.get("label") in VALID_SLUGS:
+                    self._feedback_texts.append(entry["text"])
+                    self._feedback_labels.append(entry["label"])
+            except orjson.JSONDecodeError:
+                log.warning("Skipping malformed feedback line: %s", raw_line[:80])
+        self._feedback_offset += end
+
+    def _reset_feedback(self, file_id: Optional[tuple[int, int]]) -> None:
+        self._feedback_texts = []
+        self._feedback_labels = []
+        self._feedback_offset = 0
+        self._feedback_file = file_id
+
+    def _bind(self, fast: FastClassifier) -> None:
+        """Start serving from *fast*, with a cache that only holds its results."""
+        self._predict_cached = lru_cache(maxsize=PREDICT_CACHE_SIZE)(fast.score)
+        self._fast = fast
+        self.classes_ = fast.classes_
+        self.is_trained = True
+
+    def _bind_pipeline(self, pipeline: Pipeline, verify: bool = False) -> None:
+        """
+        Install a fitted *pipeline* and serve from the arrays lifted out of it.
+        With *verify*, first check those arrays against the pipeline itself.
+        """
+        fast = FastClassifier.from_pipeline(pipeline)
+        if verify:
+            _verify_fast_path(pipeline, fast)
+        self.pipeline = pipeline
+        self._bind(fast)
+
+    def _new_clf(self, labels: list[str]) -> LogisticRegression:
+        """
+        Build the classifier step, warm-started from the live model
+        when one is bound and was fitted on the same classes.
 
-            self.pipeline = Pipeline([
+        Hashing fixes the feature space at N_FEATURES, so the previous
+        coefficients line up column for column with the new fit; only a
+        change in the label set forces a cold start.
+        """
+        clf = LogisticRegression(
+            solver="saga",
+            max_iter=200,
+            tol=1e-3,
+            C=5.0,
+            class_weight="balanced",
+            random_state=42,
+        )
+        prev = self._fast
+        if prev is None or prev.coef_T.shape[0] != N_FEATURES:
+            return clf
+        if prev.classes_ != np.unique(labels).tolist():
+            log.info("Label set changed — retraining from scratch")
+            return clf
+
+        clf.set_params(warm_start=True, max_iter=WARM_START_MAX_ITER)
+        clf.coef_ = np.array(prev.coef_T.T)
+        clf.intercept_ = np.array(prev.intercept)
+        return clf
+
+    def _train(self, texts: list[str], labels: list[str]) -> None:
+        try:
+            pipeline = Pipeline([
                 (
                     "tfidf",
-                    TfidfVectorizer(
-                        analyzer="char_wb",
-                        ngram_range=(2, 4),
-                        min_df=1,
-                        max_features=30_000,
-                        sublinear_tf=True,
-                        strip_accents="unicode",
-                        lowercase=True,
-                    ),
-                ),
-                (
-                    "clf",
-                    LogisticRegression(
-                        solver="lbfgs",
-                        multi_class="multinomial",
-                        max_iter=1_000,
-                        C=5.0,
-                        class_weight="balanced",
-                        random_state=42,
-                    ),
+                    Pipeline([
+                        (
+                            "hash",
+                            # norm=None: raw counts go in, TfidfTransformer
+                            # applies sublinear tf, idf and the l2 norm.
+                            # Texts arrive already normalised by _preprocess.
+                            HashingVectorizer(
+                                analyzer="char_wb",
+                                ngram_range=NGRAM_RANGE,
+                                n_features=N_FEATURES,
+                                alternate_sign=False,
+                                norm=None,
+                                strip_accents=None,
+                                lowercase=False,
+                                dtype=np.float32,
+                            ),
+                        ),
+                        ("tfidf", TfidfTransformer(sublinear_tf=True)),
+                    ]),
                 ),
+                ("clf", self._new_clf(labels)),
             ])
 
-            self.pipeline.fit(list(texts), list(labels))
-            self.classes_ = list(self.pipeline.classes_)
-            self.is_trained = True
+            pipeline.fit([_preprocess(t) for t in texts], labels)
+
+            # The float32 TF-IDF matrix keeps SAGA in single precision, so
+            # coef_ normally comes back float32 already; the cast guards
+            # against solvers/versions that upcast. float32 weights halve the
+            # coefficient bytes read per prediction and shrink the artifact.
+            clf: LogisticRegression = pipeline.named_steps["clf"]
+            clf.coef_ = clf.coef_.astype(np.float32)
+            clf.intercept_ = clf.intercept_.astype(np.float32)
+
+            self._bind_pipeline(pipeline)
 
+            # The joblib file goes first: the sidecars' manifest records the
+            # digest of the file they were lifted from (see _model_stamp).
             try:
-                joblib.dump(self.pipeline, self.model_path)
+                stamp = self._dump_pipeline()
             except (OSError, IOError) as exc:
                 log.exception("Failed to save model to %s: %s", self.model_path, exc)
                 raise
+            self._save_arrays(stamp)
 
             log.info(
                 "Model trained on %d samples, %d classes — saved to %s",
-                len(samples),
+                len(texts),
                 len(self.classes_),
                 self.model_path,
             )
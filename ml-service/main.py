@@ -7,8 +7,9 @@ Endpoints
 ---------
 GET  /health          — liveness + readiness probe
 POST /predict         — classify a description; returns slug + confidence
+POST /predict_batch   — classify many descriptions in one model call
 POST /feedback        — record a user correction for future retraining
-POST /retrain         — re-fit the model incorporating all stored feedback
+POST /retrain         — schedule a background re-fit incorporating all stored feedback
 
 Run locally
 -----------
@@ -18,6 +19,9 @@ Docker
 ------
     docker build -t finanalytix-ml .
     docker run -p 8000:8000 finanalytix-ml
+
+The container serves with uvicorn's C event loop and HTTP parser
+(``--loop uvloop --http httptools``).
 """
 from __future__ import annotations
 
@@ -26,11 +30,11 @@ import os
 from contextlib import asynccontextmanager
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, status
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Response, status
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 
-from classifier import TransactionClassifier, VALID_SLUGS
+from classifier import DEFAULT_TOP_K, TransactionClassifier, VALID_SLUGS
 
 load_dotenv()
 
@@ -41,6 +45,8 @@ logging.basicConfig(
 log = logging.getLogger("ml-service")
 
 MODEL_PATH = os.getenv("MODEL_PATH", "model.joblib")
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "1000"))
+MAX_DESCRIPTION_LENGTH = 500
 _classifier: TransactionClassifier | None = None
 
 
@@ -54,6 +60,7 @@ async def lifespan(app: FastAPI):
     log.info("Classifier ready — %d categories", len(_classifier.classes_))
     yield
     log.info("ML service shutting down")
+    _classifier.close()
 
 
 app = FastAPI(
@@ -82,7 +89,7 @@ class PredictRequest(BaseModel):
     description: str = Field(
         ...,
         min_length=1,
-        max_length=500,
+        max_length=MAX_DESCRIPTION_LENGTH,
         examples=["Java House coffee Westgate"],
         description="The transaction description or merchant name to classify.",
     )
@@ -92,16 +99,62 @@ class PredictRequest(BaseModel):
         examples=["expense"],
         description="Transaction type — income transactions map directly to 'income' slug.",
     )
+    top_k: int = Field(
+        default=DEFAULT_TOP_K,
+        ge=1,
+        le=len(VALID_SLUGS),
+        description="How many of the most likely categories to include in `all_scores`.",
+    )
 
 
 class PredictResponse(BaseModel):
     category_slug: str = Field(description="Predicted category slug (e.g. 'food-dining').")
     confidence: float = Field(description="Model confidence for the top class (0.0–1.0).")
-    all_scores: dict[str, float] = Field(description="Probability for every category.")
+    all_scores: dict[str, float] = Field(
+        description="Probabilities of the `top_k` most likely categories, highest first."
+    )
+
+
+class PredictBatchRequest(BaseModel):
+    descriptions: list[str] = Field(
+        ...,
+        min_length=1,
+        max_length=MAX_BATCH_SIZE,
+        examples=[["Java House coffee Westgate", "Uber trip to CBD"]],
+        description="Transaction descriptions or merchant names to classify.",
+    )
+    types: list[str] | None = Field(
+        default=None,
+        examples=[["expense", "expense"]],
+        description=(
+            "Optional per-description transaction type ('income' or 'expense'), "
+            "aligned with `descriptions`. Defaults to 'expense' for every item."
+        ),
+    )
+    top_k: int = Field(
+        default=DEFAULT_TOP_K,
+        ge=1,
+        le=len(VALID_SLUGS),
+        description="How many of the most likely categories to include in each `all_scores`.",
+    )
+
+    @model_validator(mode="after")
+    def _check_items(self) -> "PredictBatchRequest":
+        for text in self.descriptions:
+            if not 1 <= len(text) <= MAX_DESCRIPTION_LENGTH:
+                raise ValueError(
+                    f"Each description must be 1–{MAX_DESCRIPTION_LENGTH} characters long."
+                )
+        if self.types is not None:
+            if len(self.types) != len(self.descriptions):
+                raise ValueError("`types` must have the same length as `descriptions`.")
+            if any(t not in ("income", "expense") for t in self.types):
+                raise ValueError("Each type must be 'income' or 'expense'.")
+        return self
 
 
 class FeedbackRequest(BaseModel):
-    description: str = Field(..., min_length=1, max_length=500)
+    description: str = Field(..., min_length=1, max_length=MAX_DESCRIPTION_LENGTH)
     correct_category_slug: str = Field(
         ...,
         description=f"The correct category slug. Valid values: {sorted(VALID_SLUGS)}",
@@ -149,7 +202,10 @@ def health() -> HealthResponse:
         "Returns the most likely category slug for a transaction description "
         "together with the model confidence score (0–1).\n\n"
         "Income transactions (`type=income`) are always routed to the `income` "
-        "category without invoking the model."
+        "category without invoking the model. Descriptions naming an unambiguous "
+        "merchant or keyword (e.g. Netflix, KPLC, house rent) are matched by fixed "
+        "rules and returned with confidence 0.99 — except descriptions a user has "
+        "corrected to another category, which the retrained model classifies."
     ),
 )
 def predict(body: PredictRequest) -> PredictResponse:
@@ -168,7 +224,7 @@ def predict(body: PredictRequest) -> PredictResponse:
         )
 
     try:
-        slug, confidence, all_scores = _classifier.predict(body.description)
+        slug, confidence, all_scores = _classifier.predict(body.description, top_k=body.top_k)
     except Exception as exc:
         log.exception("Prediction failed: %s", exc)
         raise HTTPException(
@@ -178,11 +234,59 @@ def predict(body: PredictRequest) -> PredictResponse:
 
     return PredictResponse(
         category_slug=slug,
-        confidence=round(confidence, 4),
-        all_scores={k: round(v, 4) for k, v in all_scores.items()},
+        confidence=confidence,
+        all_scores=all_scores,
     )
 
 
+@app.post(
+    "/predict_batch",
+    response_model=list[PredictResponse],
+    status_code=status.HTTP_200_OK,
+    tags=["Prediction"],
+    summary="Classify many transaction descriptions at once",
+    description=(
+        "Batch variant of /predict: every expense description is scored in a "
+        "single model call, and results are returned in input order.\n\n"
+        "Items whose type is `income` are routed to the `income` category "
+        "without invoking the model."
+    ),
+)
+def predict_batch(body: PredictBatchRequest) -> list[PredictResponse]:
+    if _classifier is None or not _classifier.is_trained:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Classifier is not ready yet. Please retry shortly.",
+        )
+
+    types = body.types or ["expense"] * len(body.descriptions)
+    expense_idx = [i for i, t in enumerate(types) if t != "income"]
+
+    try:
+        predictions = _classifier.predict_many(
+            [body.descriptions[i] for i in expense_idx], top_k=body.top_k
+        )
+    except Exception as exc:
+        log.exception("Batch prediction failed: %s", exc)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Prediction failed. Please try again.",
+        )
+
+    # Income items keep their fixed answer; model results are spliced back in
+    results = [
+        PredictResponse(category_slug="income", confidence=1.0, all_scores={"income": 1.0})
+        for _ in types
+    ]
+    for i, (slug, confidence, all_scores) in zip(expense_idx, predictions):
+        results[i] = PredictResponse(
+            category_slug=slug,
+            confidence=confidence,
+            all_scores=all_scores,
+        )
+    return results
+
+
 @app.post(
     "/feedback",
     status_code=status.HTTP_200_OK,
@@ -190,7 +294,8 @@ def predict(body: PredictRequest) -> PredictResponse:
     summary="Record a user category correction",
     description=(
         "Stores a user-provided correction so it can be incorporated the next "
-        "time /retrain is called. No immediate effect on the current model."
+        "time /retrain is called. No immediate effect on the current model. "
+        "Corrections are buffered and appended to the feedback file in batches."
     ),
 )
 def feedback(body: FeedbackRequest) -> dict:
@@ -221,33 +326,45 @@ def feedback(body: FeedbackRequest) -> dict:
     return {"message": "Feedback recorded. Call /retrain to apply it to the model."}
 
 
+def _run_retrain() -> None:
+    try:
+        total_samples = _classifier.retrain()
+        log.info("Background retrain finished on %d total samples", total_samples)
+    except Exception as exc:
+        log.exception("Background retrain failed: %s", exc)
+
+
 @app.post(
     "/retrain",
-    status_code=status.HTTP_200_OK,
+    status_code=status.HTTP_202_ACCEPTED,
+    responses={status.HTTP_200_OK: {"description": "A retrain is already running; nothing was queued."}},
     tags=["Training"],
     summary="Retrain the classifier with accumulated feedback",
     description=(
-        "Merges all stored user corrections with the base training set and refits "
-        "the model in-place. The updated model is persisted to disk immediately."
+        "Schedules a background refit that merges all stored user corrections "
+        "with the base training set. The current model keeps serving /predict "
+        "until the new one is ready, then it is swapped in and persisted to disk.\n\n"
+        "Returns 202 with status `scheduled` when a retrain was queued, or 200 "
+        "with status `running` when one is already in progress (nothing new is "
+        "queued)."
     ),
 )
-def retrain() -> dict:
+def retrain(background_tasks: BackgroundTasks, response: Response) -> dict:
     if _classifier is None:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Classifier not initialised.",
         )
 
-    try:
-        total_samples = _classifier.retrain()
-    except Exception as exc:
-        log.exception("Retrain failed: %s", exc)
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Retrain failed. Check server logs for details.",
-        )
+    if _classifier.retrain_in_progress:
+        response.status_code = status.HTTP_200_OK
+        return {
+            "status": "running",
+            "message": "A retrain is already in progress.",
+        }
 
+    background_tasks.add_task(_run_retrain)
     return {
-        "message": f"Model retrained successfully on {total_samples} total samples.",
-        "categories": _classifier.classes_,
+        "status": "scheduled",
+        "message": "Retrain scheduled. The new model is used as soon as it is ready.",
     }
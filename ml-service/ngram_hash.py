@@ -0,0 +1,201 @@
+"""Numba char_wb n-gram hasher
+----------------------------
+Native re-implementation of the feature extraction done by the training
+pipeline's ``HashingVectorizer(analyzer="char_wb", alternate_sign=False)``,
+used to vectorise a single description at prediction time without going
+through scikit-learn's Python-level n-gram generator.
+
+The output must be bit-for-bit compatible with what the model was trained
+on, so the hashing is MurmurHash3 (x86, 32-bit, seed 0) over the UTF-8
+bytes of each n-gram — the same function scikit-learn's FeatureHasher uses —
+and the windowing follows ``_VectorizerMixin._char_wb_ngrams``:
+
+* the text is split on Unicode whitespace (``str.split()`` semantics);
+* each word is padded with one space on both sides;
+* every n in [min_n, max_n] slides over the padded word, and a word shorter
+  than n is emitted once as a whole and stops the n loop.
+
+Callers are responsible for preprocessing (lowercasing, accent stripping)
+exactly as the training vectorizer did.
+"""
+from __future__ import annotations
+
+import numpy as np
+from numba import njit
+
+_MASK32 = np.uint64(0xFFFFFFFF)
+_C1 = np.uint64(0xCC9E2D51)
+_C2 = np.uint64(0x1B873593)
+_M5 = np.uint64(5)
+_N1 = np.uint64(0xE6546B64)
+_F1 = np.uint64(0x85EBCA6B)
+_F2 = np.uint64(0xC2B2AE35)
+
+
+@njit(cache=True)
+def _is_space(c: int) -> bool:
+    """Mirror of ``str.isspace`` for a single code point."""
+    if c <= 0x20:
+        return c == 0x20 or 0x09 <= c <= 0x0D or 0x1C <= c <= 0x1F
+    if c < 0x85:
+        return False
+    return (
+        c == 0x85 or c == 0xA0 or c == 0x1680
+        or 0x2000 <= c <= 0x200A
+        or c == 0x2028 or c == 0x2029 or c == 0x202F
+        or c == 0x205F or c == 0x3000
+    )
+
+
+@njit(cache=True)
+def _utf8_encode(cps: np.ndarray, start: int, stop: int, buf: np.ndarray) -> int:
+    """Write the UTF-8 encoding of cps[start:stop] into *buf*; return its length."""
+    n = 0
+    for i in range(start, stop):
+        c = cps[i]
+        if c < 0x80:
+            buf[n] = c
+            n += 1
+        elif c < 0x800:
+            buf[n] = 0xC0 | (c >> 6)
+            buf[n + 1] = 0x80 | (c & 0x3F)
+            n += 2
+        elif c < 0x10000:
+            buf[n] = 0xE0 | (c >> 12)
+            buf[n + 1] = 0x80 | ((c >> 6) & 0x3F)
+            buf[n + 2] = 0x80 | (c & 0x3F)
+            n += 3
+        else:
+            buf[n] = 0xF0 | (c >> 18)
+            buf[n + 1] = 0x80 | ((c >> 12) & 0x3F)
+            buf[n + 2] = 0x80 | ((c >> 6) & 0x3F)
+            buf[n + 3] = 0x80 | (c & 0x3F)
+            n += 4
+    return n
+
+
+@njit(cache=True)
+def _rotl32(x: np.uint64, r: int) -> np.uint64:
+    return ((x << np.uint64(r)) | (x >> np.uint64(32 - r))) & _MASK32
+
+
+@njit(cache=True)
+def _mix_k(k: np.uint64) -> np.uint64:
+    k = (k * _C1) & _MASK32
+    k = _rotl32(k, 15)
+    return (k * _C2) & _MASK32
+
+
+@njit(cache=True)
+def _murmur3_32(data: np.ndarray, length: int) -> int:
+    """MurmurHash3_x86_32 with seed 0, returned as a signed 32-bit int."""
+    h = np.uint64(0)
+    nblocks = length // 4
+    for b in range(nblocks):
+        i = b * 4
+        k = (
+            np.uint64(data[i])
+            | (np.uint64(data[i + 1]) << np.uint64(8))
+            | (np.uint64(data[i + 2]) << np.uint64(16))
+            | (np.uint64(data[i + 3]) << np.uint64(24))
+        )
+        h ^= _mix_k(k)
+        h = _rotl32(h, 13)
+        h = (h * _M5 + _N1) & _MASK32
+
+    tail = nblocks * 4
+    rem = length & 3
+    if rem:
+        k = np.uint64(0)
+        if rem == 3:
+            k ^= np.uint64(data[tail + 2]) << np.uint64(16)
+        if rem >= 2:
+            k ^= np.uint64(data[tail + 1]) << np.uint64(8)
+        k ^= np.uint64(data[tail])
+        h ^= _mix_k(k)
+
+    h ^= np.uint64(length)
+    h ^= h >> np.uint64(16)
+    h = (h * _F1) & _MASK32
+    h ^= h >> np.uint64(13)
+    h = (h * _F2) & _MASK32
+    h ^= h >> np.uint64(16)
+    signed = np.int64(h)
+    return signed - 0x100000000 if signed >= 0x80000000 else signed
+
+
+@njit(cache=True)
+def _feature_index(h: int, n_features: int) -> int:
+    # Same mapping as sklearn.feature_extraction._hashing_fast.transform,
+    # including its special case for abs(-2**31).
+    if h == -2147483648:
+        return (2147483647 - (n_features - 1)) % n_features
+    return abs(h) % n_features
+
+
+@njit(cache=True)
+def hash_char_wb(
+    cps: np.ndarray, min_n: int, max_n: int, n_features: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Hash the char_wb n-grams of the code-point array *cps*.
+
+    Returns (indices, counts): the sorted distinct feature indices and how
+    many n-grams fell into each, i.e. the non-zero entries of the
+    HashingVectorizer(norm=None) row for the same text.
+    """
+    n_len = len(cps)
+    # Padded words sum to at most 2*len + 1 characters, and each n can emit
+    # at most one n-gram per padded character.
+    out = np.empty((max_n - min_n + 1) * (2 * n_len + 2), dtype=np.int64)
+    word = np.empty(n_len + 2, dtype=np.uint32)
+    buf = np.empty(4 * max_n, dtype=np.uint8)
+    size = 0
+
+    i = 0
+    while i < n_len:
+        if _is_space(cps[i]):
+            i += 1
+            continue
+        j = i
+        while j < n_len and not _is_space(cps[j]):
+            j += 1
+
+        w_len = j - i + 2
+        word[0] = 0x20
+        word[1:w_len - 1] = cps[i:j]
+        word[w_len - 1] = 0x20
+        for n in range(min_n, max_n + 1):
+            offset = 0
+            while True:
+                stop = min(offset + n, w_len)
+                nbytes = _utf8_encode(word, offset, stop, buf)
+                out[size] = _feature_index(_murmur3_32(buf, nbytes), n_features)
+                size += 1
+                if offset + n >= w_len:
+                    break
+                offset += 1
+            if offset == 0:  # a short word (w_len <= n) is counted only once
+                break
+        i = j
+
+    hashed = np.sort(out[:size])
+    indices = np.empty(size, dtype=np.int64)
+    counts = np.empty(size, dtype=np.float32)
+    m = 0
+    for k in range(size):
+        if m > 0 and hashed[k] == indices[m - 1]:
+            counts[m - 1] += 1.0
+        else:
+            indices[m] = hashed[k]
+            counts[m] = 1.0
+            m += 1
+    return indices[:m], counts[:m]
+
+
+def char_wb_counts(
+    text: str, ngram_range: tuple[int, int], n_features: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Python entry point: hash an already-preprocessed *text*."""
+    cps = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+    return hash_char_wb(cps, ngram_range[0], ngram_range[1], n_features)
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The service modules live at the ml-service root and import each other as
+# top-level modules (see main.py), so make that directory importable.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,390 @@
+"""
+Tests for the hand-rolled inference path and model persistence.
+
+FastClassifier and ngram_hash re-implement what the scikit-learn pipeline
+does at prediction time; the parity tests pin them to the real thing.
+"""
+from __future__ import annotations
+
+import os
+import shutil
+
+import numpy as np
+import orjson
+import pytest
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.utils import murmurhash3_32
+
+import classifier
+from classifier import (
+    FAST_RULE_CONFIDENCE,
+    NGRAM_RANGE,
+    N_FEATURES,
+    WARM_START_MAX_ITER,
+    FastClassifier,
+    TransactionClassifier,
+    _match_fast_rule,
+    _preprocess,
+)
+from ngram_hash import _feature_index, _murmur3_32, char_wb_counts
+from training_data import TRAINING_LABELS, TRAINING_TEXTS
+
+# Hand-picked inputs for the branches of ngram_hash: multi-byte and astral
+# UTF-8, every whitespace class str.split() knows, and very short words.
+EDGE_TEXTS = [
+    "",
+    " ",
+    "a",
+    "ab c",
+    "java house westgate",
+    "caf\u00e9 cr\u00e8me br\u00fbl\u00e9e",
+    "mpesa   till\t1234\nkes",
+    "nbsp\xa0split",
+    "nel\x85split",
+    "ideographic\u3000space",
+    "line\u2028para\u2029sep",
+    "ogham\u1680space",
+    "thin\u2009narrow\u202fmedium\u205fspace",
+    "unit\x1fsep\x1crecord",
+    "zero\u200bwidth",  # not whitespace for str.split()
+    "\u6771\u4eac \u30e9\u30fc\u30e1\u30f3 \uc11c\uc6b8",
+    "\U0001f355 pizza \U0001f695\U0001f695 taxi",
+    "\U0001d518\U0001d52b\U0001d526 \U00010348",
+    "\u00df \ufb01 \u0130",
+]
+
+# Every whitespace code point in the Basic Multilingual Plane, plus a spread
+# of 1- to 4-byte UTF-8 characters for the fuzz alphabet.
+_WHITESPACE = [chr(c) for c in range(0x10000) if chr(c).isspace()]
+_ALPHABET = (
+    list("abcdefghijklmnopqrstuvwxyz0123456789-*#.")
+    + list("\u00e9\u00fc\u00e7\u00f1\u00f8\u00e5\u00df\u0153")
+    + list("\u03b1\u03b2\u03b3\u0436\u0449\u4e2d\u6587\ud55c\uad6d")
+    + ["\U0001f355", "\U0001f695", "\U0001d518", "\U00010348"]
+    + _WHITESPACE
+)
+
+
+def _random_texts(n: int, seed: int = 0) -> list[str]:
+    rng = np.random.default_rng(seed)
+    return [
+        "".join(rng.choice(_ALPHABET, size=rng.integers(0, 40)))
+        for _ in range(n)
+    ]
+
+
+def _sklearn_row(vectorizer: HashingVectorizer, text: str) -> tuple[np.ndarray, np.ndarray]:
+    row = vectorizer.transform([text])
+    row.sort_indices()
+    return row.indices.astype(np.int64), row.data
+
+
+@pytest.fixture(scope="module")
+def vectorizer() -> HashingVectorizer:
+    # Same settings as the "hash" step built by TransactionClassifier._train.
+    return HashingVectorizer(
+        analyzer="char_wb",
+        ngram_range=NGRAM_RANGE,
+        n_features=N_FEATURES,
+        alternate_sign=False,
+        norm=None,
+        strip_accents=None,
+        lowercase=False,
+        dtype=np.float32,
+    )
+
+
+@pytest.fixture(scope="module")
+def trained(tmp_path_factory) -> TransactionClassifier:
+    model = TransactionClassifier(
+        model_path=str(tmp_path_factory.mktemp("model") / "model.joblib")
+    )
+    model.load_or_train()
+    return model
+
+
+# ── ngram_hash ───────────────────────────────────────────────────────────────
+
+@pytest.mark.parametrize("text", EDGE_TEXTS)
+def test_char_wb_counts_matches_hashing_vectorizer(vectorizer, text):
+    expected_idx, expected_counts = _sklearn_row(vectorizer, text)
+    idx, counts = char_wb_counts(text, NGRAM_RANGE, N_FEATURES)
+    np.testing.assert_array_equal(idx, expected_idx)
+    np.testing.assert_array_equal(counts, expected_counts)
+
+
+def test_char_wb_counts_fuzz(vectorizer):
+    for text in _random_texts(500):
+        expected_idx, expected_counts = _sklearn_row(vectorizer, text)
+        idx, counts = char_wb_counts(text, NGRAM_RANGE, N_FEATURES)
+        np.testing.assert_array_equal(idx, expected_idx, err_msg=repr(text))
+        np.testing.assert_array_equal(counts, expected_counts, err_msg=repr(text))
+
+
+def test_murmur3_matches_sklearn():
+    rng = np.random.default_rng(1)
+    # Cover every tail length (0–3 trailing bytes) and bytes >= 0x80.
+    for length in list(range(17)) + [63, 64, 65]:
+        data = rng.integers(0, 256, size=length, dtype=np.uint8)
+        buf = np.zeros(max(length, 1), dtype=np.uint8)
+        buf[:length] = data
+        assert _murmur3_32(buf, length) == murmurhash3_32(data.tobytes(), seed=0)
+
+
+@pytest.mark.parametrize("n_features", [N_FEATURES, 1000, 7])
+def test_feature_index_int32_min(n_features):
+    # No short n-gram is known to hash to -2**31, so check the special case
+    # against the formula in sklearn.feature_extraction._hashing_fast.
+    assert _feature_index(-2 ** 31, n_features) == (2 ** 31 - 1 - (n_features - 1)) % n_features
+    assert _feature_index(-5, n_features) == 5 % n_features
+    assert _feature_index(2 ** 31 - 1, n_features) == (2 ** 31 - 1) % n_features
+
+
+# ── FastClassifier ───────────────────────────────────────────────────────────
+
+def _parity_probe() -> list[str]:
+    raw = TRAINING_TEXTS[::7] + EDGE_TEXTS + _random_texts(100, seed=2)
+    return [_preprocess(t) for t in raw]
+
+
+def test_predict_proba_one_matches_pipeline(trained):
+    probe = _parity_probe()
+    expected = trained.pipeline.predict_proba(probe)
+    actual = np.vstack([trained._fast.predict_proba_one(t) for t in probe])
+    np.testing.assert_allclose(actual, expected, atol=1e-5)
+
+
+def test_predict_proba_matches_pipeline(trained):
+    probe = _parity_probe()
+    expected = trained.pipeline.predict_proba(probe)
+    np.testing.assert_allclose(trained._fast.predict_proba(probe), expected, atol=1e-5)
+
+
+def test_predict_many_matches_predict(trained):
+    descriptions = ["Java House coffee", "Uber to CBD", "Caf\u00e9 \u00d1and\u00fa \U0001f355", "NETFLIX"]
+    assert trained.predict_many(descriptions) == [trained.predict(d) for d in descriptions]
+
+
+# ── Persistence ──────────────────────────────────────────────────────────────
+
+def _coef(model: TransactionClassifier) -> np.ndarray:
+    return np.asarray(model._fast.coef_T)
+
+
+def test_blocked_sidecars_keep_the_saved_model(tmp_path):
+    path = str(tmp_path / "model.joblib")
+    model = TransactionClassifier(model_path=path)
+    model._train(TRAINING_TEXTS + ["java house westgate"], TRAINING_LABELS + ["food-dining"])
+    # Replace the sidecar directory with a plain file so it cannot be written.
+    shutil.rmtree(model.arrays_path)
+    open(model.arrays_path, "w").close()
+    stamp = model._model_stamp()
+
+    reloaded = TransactionClassifier(model_path=path)
+    reloaded.load_or_train()
+
+    assert reloaded.is_trained
+    assert reloaded._model_stamp() == stamp
+    np.testing.assert_array_equal(_coef(reloaded), _coef(model))
+
+
+def test_sidecars_older_than_the_joblib_are_ignored(tmp_path):
+    path = str(tmp_path / "model.joblib")
+    model = TransactionClassifier(model_path=path)
+    model.load_or_train()
+    old_coef = _coef(model).copy()
+
+    # Simulate a crash between writing a new joblib and its sidecars.
+    model._train(TRAINING_TEXTS[::2], TRAINING_LABELS[::2])
+    new_coef = _coef(model).copy()
+    model._fast = FastClassifier(old_coef, model._fast.intercept, model._fast.idf, model._fast.classes)
+    model._save_arrays("stale")
+
+    reloaded = TransactionClassifier(model_path=path)
+    reloaded.load_or_train()
+    np.testing.assert_array_equal(_coef(reloaded), new_coef)
+    # ... and the sidecars were rewritten to match it.
+    np.testing.assert_array_equal(
+        FastClassifier.load(reloaded.arrays_path, reloaded._model_stamp()).coef_T, new_coef
+    )
+
+
+@pytest.mark.parametrize("copy", [shutil.copy2, shutil.copy], ids=["cp -a", "cp"])
+def test_copied_artifact_maps_its_sidecars(tmp_path, copy):
+    os.makedirs(tmp_path / "s1")
+    original = TransactionClassifier(model_path=str(tmp_path / "s1" / "model.joblib"))
+    original.load_or_train()
+    # A copy gets new inodes (and, without -a, new mtimes).
+    shutil.copytree(tmp_path / "s1", tmp_path / "s2", copy_function=copy)
+
+    copied = TransactionClassifier(model_path=str(tmp_path / "s2" / "model.joblib"))
+    copied.load_or_train()
+    assert copied.pipeline is None  # mapped, not unpickled
+    np.testing.assert_array_equal(_coef(copied), _coef(original))
+
+
+def _snapshot(directory) -> dict[str, tuple[int, int]]:
+    return {
+        os.path.relpath(os.path.join(root, name), directory): (
+            os.stat(os.path.join(root, name)).st_mtime_ns,
+            os.stat(os.path.join(root, name)).st_size,
+        )
+        for root, _, names in os.walk(directory)
+        for name in names
+        if not name.endswith(".lock")  # opened, never written
+    }
+
+
+def test_fresh_copy_maps_without_rewriting(tmp_path):
+    os.makedirs(tmp_path / "build")
+    TransactionClassifier(model_path=str(tmp_path / "build" / "model.joblib")).load_or_train()
+    shutil.copytree(tmp_path / "build", tmp_path / "run")
+    before = _snapshot(tmp_path / "run")
+
+    workers = [
+        TransactionClassifier(model_path=str(tmp_path / "run" / "model.joblib"))
+        for _ in range(2)
+    ]
+    for worker in workers:
+        worker.load_or_train()
+
+    assert all(worker.pipeline is None for worker in workers)
+    assert _snapshot(tmp_path / "run") == before
+
+
+def test_save_commits_one_generation(tmp_path):
+    model = TransactionClassifier(model_path=str(tmp_path / "model.joblib"))
+    model.load_or_train()
+    model._fast.save(model.arrays_path, "first")
+    model._fast.save(model.arrays_path, "second")
+
+    files = sorted(os.listdir(model.arrays_path))
+    assert len(files) == len(FastClassifier.ARRAY_NAMES) + 1
+    with pytest.raises(ValueError):
+        FastClassifier.load(model.arrays_path, "first")
+    np.testing.assert_array_equal(
+        FastClassifier.load(model.arrays_path, "second").coef_T, _coef(model)
+    )
+
+
+# ── Feedback ─────────────────────────────────────────────────────────────────
+
+@pytest.fixture
+def feedback_model(tmp_path, monkeypatch):
+    monkeypatch.setattr(classifier, "FEEDBACK_PATH", str(tmp_path / "feedback.jsonl"))
+    # Flush only when a test asks for it.
+    monkeypatch.setattr(classifier, "FEEDBACK_FLUSH_INTERVAL", 60.0)
+    model = TransactionClassifier(model_path=str(tmp_path / "model.joblib"))
+    yield model
+    model.close()
+
+
+def test_feedback_write_errors_reach_the_caller(feedback_model, tmp_path, monkeypatch):
+    good_path = classifier.FEEDBACK_PATH
+    monkeypatch.setattr(classifier, "FEEDBACK_PATH", str(tmp_path))  # a directory
+    feedback_model.add_feedback("java house", "food-dining")
+    feedback_model.flush_feedback()
+
+    with pytest.raises(OSError):
+        feedback_model.add_feedback("uber trip", "transport")
+
+    monkeypatch.setattr(classifier, "FEEDBACK_PATH", good_path)
+    feedback_model.flush_feedback()
+    feedback_model.add_feedback("uber trip", "transport")
+    feedback_model.flush_feedback()
+    with open(good_path, "rb") as fh:
+        assert [line["text"] for line in map(orjson.loads, fh)] == ["java house", "uber trip"]
+
+
+def test_feedback_queue_is_bounded(feedback_model, monkeypatch):
+    monkeypatch.setattr(classifier, "FEEDBACK_MAX_PENDING", 2)
+    feedback_model.add_feedback("java house", "food-dining")
+    feedback_model.add_feedback("uber trip", "transport")
+    with pytest.raises(RuntimeError):
+        feedback_model.add_feedback("kplc token", "utilities")
+
+
+def test_feedback_reader_follows_rotation(feedback_model):
+    path = classifier.FEEDBACK_PATH
+    with open(path, "wb") as fh:
+        fh.write(orjson.dumps({"text": "old entry", "label": "other"}) + b"\n")
+    feedback_model._read_new_feedback()
+    assert feedback_model._feedback_texts == ["old entry"]
+
+    # Rotate in a new file that is larger than the offset already consumed.
+    rotated = path + ".new"
+    with open(rotated, "wb") as fh:
+        for text, label in (("java house westgate", "food-dining"), ("uber trip to cbd", "transport")):
+            fh.write(orjson.dumps({"text": text, "label": label}) + b"\n")
+    os.replace(rotated, path)
+
+    feedback_model._read_new_feedback()
+    assert feedback_model._feedback_texts == ["java house westgate", "uber trip to cbd"]
+
+
+# ── Fast rules ───────────────────────────────────────────────────────────────
+
+@pytest.mark.parametrize(
+    "description, slug",
+    [
+        ("Bolt Food order", "food-dining"),
+        ("Uber Eats order", "food-dining"),
+        ("Bolt ride to CBD", "transport"),
+        ("UBER TRIP", "transport"),
+        ("house rent - Jan", "rent-housing"),
+        ("rent deposit landlord", "rent-housing"),
+        ("rent a car", None),
+        ("car rent 2 days", None),
+        ("NETFLIX.COM", "entertainment"),
+        ("groceries naivas", None),
+    ],
+)
+def test_fast_rule_order_and_scope(description, slug):
+    assert _match_fast_rule(_preprocess(description)) == slug
+
+
+def test_feedback_outranks_fast_rules(feedback_model):
+    feedback_model.load_or_train()
+    assert feedback_model.predict("Netflix gift card for mum")[0] == "entertainment"
+
+    feedback_model.add_feedback("Netflix gift card for mum", "social")
+    # Agreeing with the rule must not take a description off the fast path.
+    feedback_model.add_feedback("Netflix subscription", "entertainment")
+    feedback_model.retrain()
+
+    slug, confidence, _ = feedback_model.predict("netflix gift card for mum ")
+    assert slug == "social"
+    assert confidence != FAST_RULE_CONFIDENCE
+    assert feedback_model.predict("Netflix subscription")[1] == FAST_RULE_CONFIDENCE
+    assert [p[0] for p in feedback_model.predict_many(["Netflix gift card for mum"])] == ["social"]
+
+    # ... and still does after a restart.
+    restarted = TransactionClassifier(model_path=feedback_model.model_path)
+    restarted.load_or_train()
+    assert restarted.predict("Netflix gift card for mum")[0] == "social"
+
+
+# ── Warm start ───────────────────────────────────────────────────────────────
+
+def test_retrain_warm_starts_on_the_same_classes(tmp_path):
+    model = TransactionClassifier(model_path=str(tmp_path / "model.joblib"))
+    model.load_or_train()
+
+    model._train(TRAINING_TEXTS + ["mama oliech fish"], TRAINING_LABELS + ["food-dining"])
+
+    clf = model.pipeline.named_steps["clf"]
+    assert clf.warm_start
+    assert clf.n_iter_.max() <= WARM_START_MAX_ITER
+
+
+def test_retrain_cold_starts_when_a_class_is_missing(tmp_path):
+    model = TransactionClassifier(model_path=str(tmp_path / "model.joblib"))
+    model.load_or_train()
+    kept = [(t, l) for t, l in zip(TRAINING_TEXTS, TRAINING_LABELS) if l != "savings"]
+
+    model._train([t for t, _ in kept], [l for _, l in kept])
+
+    clf = model.pipeline.named_steps["clf"]
+    assert not clf.warm_start
+    assert "savings" not in model.classes_
+    assert model._fast.coef_T.shape == (N_FEATURES, len(model.classes_))
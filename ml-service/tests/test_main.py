@@ -0,0 +1,122 @@
+"""
+Route tests for the HTTP layer. The real model is never loaded here: routes
+that need one get a StubClassifier bound in its place.
+"""
+from __future__ import annotations
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from main import MAX_DESCRIPTION_LENGTH, app
+
+# Not used as a context manager, so the lifespan (model load) does not run;
+# validation errors are raised before any handler touches the classifier.
+client = TestClient(app)
+
+
+@pytest.mark.parametrize("description", ["", "x" * (MAX_DESCRIPTION_LENGTH + 1)])
+@pytest.mark.parametrize(
+    "route, body",
+    [
+        ("/predict", lambda d: {"description": d}),
+        ("/predict_batch", lambda d: {"descriptions": ["ok", d]}),
+        ("/feedback", lambda d: {"description": d, "correct_category_slug": "other"}),
+    ],
+)
+def test_description_length_errors_share_one_format(route, body, description):
+    response = client.post(route, json=body(description))
+    assert response.status_code == 422
+    detail = response.json()["detail"]
+    assert isinstance(detail, list) and {"loc", "msg", "type"} <= detail[0].keys()
+
+
+class StubClassifier:
+    """Records what reaches the model; every expense is 'other' at 0.5."""
+
+    is_trained = True
+    classes_ = ["other"]
+
+    def __init__(self) -> None:
+        self.batches: list[list[str]] = []
+
+    def predict_many(self, descriptions, top_k=None):
+        self.batches.append(list(descriptions))
+        return [("other", 0.5, {"other": 0.5, "echo": len(d)}) for d in descriptions]
+
+
+@pytest.fixture
+def stub(monkeypatch) -> StubClassifier:
+    bound = StubClassifier()
+    monkeypatch.setattr(main, "_classifier", bound)
+    return bound
+
+
+def test_predict_batch_splices_income_items_back_in_order(stub):
+    descriptions = ["salary march", "java house", "freelance payout", "uber to cbd"]
+    response = client.post(
+        "/predict_batch",
+        json={"descriptions": descriptions, "types": ["income", "expense", "income", "expense"]},
+    )
+
+    assert response.status_code == 200
+    assert stub.batches == [["java house", "uber to cbd"]]
+    assert [item["all_scores"] for item in response.json()] == [
+        {"income": 1.0},
+        {"other": 0.5, "echo": len("java house")},
+        {"income": 1.0},
+        {"other": 0.5, "echo": len("uber to cbd")},
+    ]
+    assert [item["confidence"] for item in response.json()] == [1.0, 0.5, 1.0, 0.5]
+
+
+def test_predict_batch_defaults_every_item_to_expense(stub):
+    response = client.post("/predict_batch", json={"descriptions": ["a", "b"]})
+    assert response.status_code == 200
+    assert stub.batches == [["a", "b"]]
+
+
+@pytest.mark.parametrize(
+    "types",
+    [["income"], ["income", "expense", "expense"], ["income", "transfer"]],
+    ids=["too-few", "too-many", "bad-value"],
+)
+def test_predict_batch_rejects_bad_types(stub, types):
+    response = client.post("/predict_batch", json={"descriptions": ["a", "b"], "types": types})
+    assert response.status_code == 422
+    assert stub.batches == []
+
+
+class StubRetrainer:
+    is_trained = True
+    classes_ = ["other"]
+
+    def __init__(self, in_progress: bool) -> None:
+        self.retrain_in_progress = in_progress
+        self.calls = 0
+
+    def retrain(self) -> int:
+        self.calls += 1
+        return 1
+
+
+def test_retrain_schedules_a_background_refit(monkeypatch):
+    bound = StubRetrainer(in_progress=False)
+    monkeypatch.setattr(main, "_classifier", bound)
+
+    response = client.post("/retrain")
+
+    assert response.status_code == 202
+    assert response.json()["status"] == "scheduled"
+    assert bound.calls == 1  # TestClient runs background tasks before returning
+
+
+def test_retrain_while_running_queues_nothing(monkeypatch):
+    bound = StubRetrainer(in_progress=True)
+    monkeypatch.setattr(main, "_classifier", bound)
+
+    response = client.post("/retrain")
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "running"
+    assert bound.calls == 0
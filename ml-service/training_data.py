@@ -337,3 +337,9 @@ TRAINING_SAMPLES: list[tuple[str, str]] = [
     ("G4S parcel delivery", "other"),
     ("money transfer", "other"),
 ]
+
+# Column-wise views consumed by the classifier: parallel lists that can be
+# concatenated with feedback and passed to fit() without a per-train
+# zip(*samples) transpose.
+TRAINING_TEXTS: list[str] = [text for text, _ in TRAINING_SAMPLES]
+TRAINING_LABELS: list[str] = [label for _, label in TRAINING_SAMPLES]